@@ -0,0 +1,203 @@
+# archive_reader.py
+import argparse
+import json
+import os
+import posixpath
+import re
+import tarfile
+import zipfile
+import cv2
+import numpy as np
+from batch_runner import check_batch
+from checker import AlignmentChecker
+
+IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png', 'bmp', 'tif', 'tiff')
+
+
+class CaptureArchive:
+    """
+    Read captures straight from a zip or tar archive without extracting them.
+
+    Members are read sequentially into memory and decoded with cv2.imdecode.
+    References and tests are paired by naming convention, e.g. rfc_3.jpg is
+    the reference for ffc_3.jpg in the same archive directory. Because
+    pairing happens while streaming, compressed tar archives are read in a
+    single pass and only captures still waiting for their partner are held
+    in memory.
+    """
+
+    def __init__(self, path, reference_prefix='rfc', test_prefix='ffc'):
+        self.path = path
+        self.reference_members = {}
+        self.duplicate_members = []
+        self._waiting = {}
+        self.reference_prefix = reference_prefix
+        self.test_prefix = test_prefix
+        self.name_pattern = re.compile(
+            rf"^(?P<prefix>{re.escape(reference_prefix)}|{re.escape(test_prefix)})_(?P<index>\d+)"
+            rf"\.(?:{'|'.join(IMAGE_EXTENSIONS)})$",
+            re.IGNORECASE,
+        )
+
+        if zipfile.is_zipfile(path):
+            self.archive = zipfile.ZipFile(path)
+        elif tarfile.is_tarfile(path):
+            # Stream mode: a single forward pass, also over compressed tars
+            self.archive = tarfile.open(path, 'r|*')
+        else:
+            raise ValueError(f"Unsupported archive format: {path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.archive.close()
+
+    def _iter_members(self):
+        """Yield (member name, raw bytes) for every regular file in archive order"""
+        if isinstance(self.archive, zipfile.ZipFile):
+            for info in self.archive.infolist():
+                if not info.is_dir():
+                    yield info.filename, self.archive.read(info)
+        else:
+            for member in self.archive:
+                if member.isfile():
+                    yield member.name, self.archive.extractfile(member).read()
+
+    def _parse_name(self, name):
+        """
+        Split a member name into its pairing key and role.
+
+        Returns:
+            Tuple of ((directory, index), is_reference), or None for other files
+        """
+        directory, filename = posixpath.split(name)
+        match = self.name_pattern.match(filename)
+        if match is None:
+            return None
+        is_reference = match.group('prefix').lower() == self.reference_prefix.lower()
+        return (directory, int(match.group('index'))), is_reference
+
+    @staticmethod
+    def decode(data):
+        """Decode an encoded image buffer to grayscale"""
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise ValueError("Could not decode image")
+        return image
+
+    def iter_pairs(self):
+        """
+        Yield (test member, reference, test) triples as soon as both captures
+        of a pair have been read, ready for batch_runner.check_batch.
+
+        Images are decoded lazily; a member that fails to decode is passed on
+        as None so the checker reports it as an unreadable image. The
+        reference member of each pair is recorded in reference_members, and
+        captures whose partner never shows up are returned by unpaired().
+        When a second capture with the same directory, index and role shows
+        up before the pair is complete (e.g. ffc_3.png and ffc_3.jpg), the
+        later one is kept and the earlier one goes to duplicate_members;
+        captures arriving after their pair was already yielded go there too.
+        """
+        self._waiting = {}
+        self.reference_members = {}
+        self.duplicate_members = []
+        completed = set()
+        for name, data in self._iter_members():
+            parsed = self._parse_name(name)
+            if parsed is None:
+                continue
+            key, is_reference = parsed
+
+            if key in completed:
+                self.duplicate_members.append(name)
+                continue
+
+            partner = self._waiting.get(key)
+            if partner is None or partner[2] == is_reference:
+                if partner is not None:
+                    self.duplicate_members.append(partner[0])
+                self._waiting[key] = (name, data, is_reference)
+                continue
+
+            del self._waiting[key]
+            completed.add(key)
+            partner_name, partner_data, _ = partner
+            if is_reference:
+                reference_name, reference_data, test_name, test_data = name, data, partner_name, partner_data
+            else:
+                reference_name, reference_data, test_name, test_data = partner_name, partner_data, name, data
+
+            self.reference_members[test_name] = reference_name
+            yield test_name, self._decode_or_none(reference_data), self._decode_or_none(test_data)
+
+    def unpaired(self):
+        """Member names left without a partner after iter_pairs() has finished"""
+        return sorted(name for name, _, _ in self._waiting.values())
+
+    def _decode_or_none(self, data):
+        try:
+            return self.decode(data)
+        except ValueError:
+            return None
+
+
+def check_archive(checker, archive_path, output_path=None, reference_prefix='rfc', test_prefix='ffc'):
+    """
+    Run the alignment check on every reference/test pair in an archive.
+
+    Results are keyed by the test member name (with 'reference_member'
+    added) and written to output_path, by default next to the archive.
+    Duplicate captures are reported under '<member name>#dup<N>' so they
+    never replace the result of a checked pair.
+
+    Returns:
+        Dictionary of member name to result
+    """
+    output_path = output_path or f"{archive_path}.results.json"
+    results = {}
+
+    with CaptureArchive(archive_path, reference_prefix, test_prefix) as archive:
+        for name, result in check_batch(checker, archive.iter_pairs()):
+            result['reference_member'] = archive.reference_members[name]
+            results[name] = result
+
+        for name in archive.unpaired():
+            results[name] = {'error': "No matching reference or test capture in archive"}
+
+        for name in archive.duplicate_members:
+            index = 1
+            while f"{name}#dup{index}" in results:
+                index += 1
+            results[f"{name}#dup{index}"] = {
+                'error': "Duplicate capture, another member with the same directory, index and role was used"
+            }
+
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    aligned = sum(1 for result in results.values() if result.get('is_aligned'))
+    print(f"Checked {len(results)} captures from {os.path.basename(archive_path)}: {aligned} aligned")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check alignment of captures inside zip/tar archives")
+    parser.add_argument('archives', nargs='+')
+    parser.add_argument('--output', help="results file (only with a single archive)")
+    parser.add_argument('--reference-prefix', default='rfc')
+    parser.add_argument('--test-prefix', default='ffc')
+    args = parser.parse_args()
+
+    checker = AlignmentChecker(visualize=False, verbose=False)
+    for archive_path in args.archives:
+        output_path = args.output if len(args.archives) == 1 else None
+        check_archive(checker, archive_path, output_path, args.reference_prefix, args.test_prefix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+# batch_runner.py
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import socket
+import time
+import numpy as np
+from checker import AlignmentChecker
+from generate_checkerboard import PATTERN_TYPES
+from reference_profile import ReferenceProfile
+
+
+def to_serializable(value):
+    """Convert numpy values in a result dictionary into plain JSON types"""
+    if isinstance(value, dict):
+        return {str(key): to_serializable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_serializable(item) for item in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _summarize_refinement(stats):
+    """Replace per-corner refinement arrays by their mean so batch results stay small"""
+    if not stats:
+        return stats
+    return {
+        (f"mean_{name}" if isinstance(value, np.ndarray) else name):
+            (float(np.mean(value)) if isinstance(value, np.ndarray) else value)
+        for name, value in stats.items()
+    }
+
+
+def check_batch(checker, pairs):
+    """
+    Run the alignment check over (key, reference, test) triples.
+
+    References and tests can be anything find_corners accepts (paths or
+    grayscale arrays). A reference path ending in .json is loaded once as a
+    ReferenceProfile. Failures are reported per pair instead of aborting
+    the batch. Per-corner refinement statistics are reduced to their means.
+
+    Yields:
+        Tuples of (key, result dictionary)
+    """
+    profiles = {}
+    for key, reference, test in pairs:
+        try:
+            if isinstance(reference, str) and reference.endswith('.json'):
+                if reference not in profiles:
+                    profiles[reference] = ReferenceProfile.load(reference)
+                reference = profiles[reference]
+            result = checker.check_alignment(reference, test)
+            for name in ('ref_refinement', 'test_refinement'):
+                result[name] = _summarize_refinement(result.get(name))
+        except Exception as e:
+            result = {'error': str(e)}
+        yield key, to_serializable(result)
+
+
+def read_manifest(manifest_path):
+    """
+    Read a CSV manifest of reference,test image pairs.
+
+    Returns:
+        List of (key, reference, test) triples keyed by the test image path
+    """
+    pairs = []
+    with open(manifest_path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith('#') or row == ['reference', 'test']:
+                continue
+            reference, test = (value.strip() for value in row[:2])
+            pairs.append((test, reference, test))
+    return pairs
+
+
+def _write_json_atomic(path, data):
+    """Write JSON next to its destination and rename it into place"""
+    tmp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class ShardQueue:
+    """
+    File-based work queue shared by all workers through a common directory.
+
+    Each shard is a JSON file that moves between directories:
+
+        pending/  ->  leased/  ->  done/
+                         |
+                         +-->  failed/
+
+    Claiming a shard is a single os.rename from pending/ to leased/, which is
+    atomic on a shared filesystem, so exactly one worker wins and no lock
+    files are needed. The rename also bumps the attempt count kept in the
+    file name (shard-000001.attempt2.json). A leased shard's mtime is its
+    heartbeat; shards whose heartbeat is older than the lease timeout are
+    renamed back to pending/ so that work held by crashed workers gets
+    picked up again, or to failed/ once they have used up their attempts.
+    Results land in results/ as JSON Lines before the shard is marked done,
+    so a crash between the two only causes the shard to be recomputed.
+    """
+
+    name_pattern = re.compile(r'^(?P<base>.+?)(?:\.attempt(?P<attempts>\d+))?\.json$')
+
+    def __init__(self, root):
+        self.root = root
+        self.pending_dir = os.path.join(root, 'pending')
+        self.leased_dir = os.path.join(root, 'leased')
+        self.done_dir = os.path.join(root, 'done')
+        self.failed_dir = os.path.join(root, 'failed')
+        self.results_dir = os.path.join(root, 'results')
+        self.config_path = os.path.join(root, 'config.json')
+        self.directories = (self.pending_dir, self.leased_dir, self.done_dir, self.failed_dir, self.results_dir)
+
+    def _parse_name(self, name):
+        """
+        Split a shard file name into its base name and attempt count.
+
+        Returns:
+            Tuple of (base name, attempts), or None for other files
+        """
+        match = self.name_pattern.match(name)
+        if match is None:
+            return None
+        return match.group('base'), int(match.group('attempts') or 0)
+
+    def create(self, pairs, shard_size=100, checker_kwargs=None):
+        """
+        Split (key, reference, test) triples into shards in pending/.
+
+        Anything left in the queue directories from an earlier run is removed
+        first, so old results are never merged with the new ones. The
+        checker settings are stored in config.json so that every worker, on
+        every host, checks with the same thresholds and target.
+        """
+        for directory in self.directories:
+            shutil.rmtree(directory, ignore_errors=True)
+            os.makedirs(directory)
+        _write_json_atomic(self.config_path, checker_kwargs or {})
+
+        shard_names = []
+        for index, start in enumerate(range(0, len(pairs), shard_size)):
+            name = f"shard-{index:06d}.json"
+            _write_json_atomic(os.path.join(self.pending_dir, name), pairs[start:start + shard_size])
+            shard_names.append(name)
+        return shard_names
+
+    def load_config(self):
+        """AlignmentChecker keyword arguments stored by create()"""
+        try:
+            with open(self.config_path) as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            return {}
+        if 'checkerboard_size' in config:
+            config['checkerboard_size'] = tuple(config['checkerboard_size'])
+        return config
+
+    def claim(self):
+        """
+        Lease the next pending shard.
+
+        Returns:
+            Tuple of (leased shard name, list of pairs), or None if nothing is pending
+        """
+        for name in sorted(os.listdir(self.pending_dir)):
+            parsed = self._parse_name(name)
+            if parsed is None:
+                continue
+            base, attempts = parsed
+            pending_path = os.path.join(self.pending_dir, name)
+            leased_name = f"{base}.attempt{attempts + 1}.json"
+            leased_path = os.path.join(self.leased_dir, leased_name)
+            try:
+                # rename keeps the mtime, so start the lease clock before the
+                # shard becomes visible in leased/
+                os.utime(pending_path)
+                os.rename(pending_path, leased_path)
+                with open(leased_path) as f:
+                    pairs = [tuple(pair) for pair in json.load(f)]
+            except FileNotFoundError:
+                continue  # Another worker claimed it first, or the lease was lost
+            return leased_name, pairs
+        return None
+
+    def heartbeat(self, name):
+        """Extend the lease on a shard"""
+        try:
+            os.utime(os.path.join(self.leased_dir, name))
+        except FileNotFoundError:
+            pass
+
+    def complete(self, name, results):
+        """
+        Store the results for a shard as JSON Lines and mark it done.
+
+        Args:
+            name: Leased shard name returned by claim()
+            results: Iterable of (key, result) tuples
+        """
+        base, _ = self._parse_name(name)
+        path = os.path.join(self.results_dir, f"{base}.jsonl")
+        tmp_path = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            for key, result in results:
+                f.write(json.dumps([key, result]) + '\n')
+        os.replace(tmp_path, path)
+        try:
+            os.rename(os.path.join(self.leased_dir, name), os.path.join(self.done_dir, name))
+        except FileNotFoundError:
+            pass  # Lease expired and the shard was re-leased; results are identical
+
+    def requeue_expired(self, lease_timeout, max_attempts=3):
+        """
+        Move shards whose lease has not been renewed back to pending/, or to
+        failed/ after max_attempts leases.
+
+        Returns:
+            Tuple of (requeued names, failed names)
+        """
+        requeued, failed = [], []
+        now = time.time()
+        for name in os.listdir(self.leased_dir):
+            parsed = self._parse_name(name)
+            if parsed is None:
+                continue
+            leased_path = os.path.join(self.leased_dir, name)
+            try:
+                if now - os.path.getmtime(leased_path) <= lease_timeout:
+                    continue
+                if parsed[1] >= max_attempts:
+                    os.rename(leased_path, os.path.join(self.failed_dir, name))
+                    failed.append(name)
+                else:
+                    os.rename(leased_path, os.path.join(self.pending_dir, name))
+                    requeued.append(name)
+            except FileNotFoundError:
+                continue
+        return requeued, failed
+
+    def is_finished(self):
+        """True once every shard is done or failed"""
+        return not os.listdir(self.pending_dir) and not os.listdir(self.leased_dir)
+
+    def iter_results(self):
+        """
+        Yield (key, result) tuples shard by shard without loading all results.
+
+        Pairs of shards that failed without ever producing results are
+        reported with an error.
+        """
+        completed = set()
+        for name in sorted(os.listdir(self.results_dir)):
+            if not name.endswith('.jsonl'):
+                continue
+            completed.add(name[:-len('.jsonl')])
+            with open(os.path.join(self.results_dir, name)) as f:
+                for line in f:
+                    key, result = json.loads(line)
+                    yield key, result
+
+        for name in sorted(os.listdir(self.failed_dir)):
+            parsed = self._parse_name(name)
+            if parsed is None or parsed[0] in completed:
+                continue
+            with open(os.path.join(self.failed_dir, name)) as f:
+                for key, _, _ in json.load(f):
+                    yield key, {'error': f"Shard {parsed[0]} failed after {parsed[1]} attempts"}
+
+
+def run_worker(queue_root, worker_id=None, lease_timeout=300.0, poll_interval=1.0, checker_kwargs=None,
+               max_attempts=3):
+    """
+    Claim and process shards until the queue is drained.
+
+    Workers keep polling while other workers still hold leases, so a shard
+    re-leased after a crash is picked up by whoever is still running. A
+    shard whose lease expires max_attempts times is moved to failed/.
+    The checker uses the settings stored in the queue, with checker_kwargs
+    taking precedence.
+
+    Returns:
+        Number of shards processed by this worker
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = ShardQueue(queue_root)
+    checker = AlignmentChecker(**{**queue.load_config(), **(checker_kwargs or {}),
+                                  'visualize': False, 'verbose': False})
+    processed = 0
+
+    while True:
+        _, failed = queue.requeue_expired(lease_timeout, max_attempts)
+        for failed_name in failed:
+            print(f"[{worker_id}] giving up on {failed_name} after {max_attempts} attempts")
+        claimed = queue.claim()
+        if claimed is None:
+            if queue.is_finished():
+                return processed
+            time.sleep(poll_interval)
+            continue
+
+        name, pairs = claimed
+        results = []
+        for key, result in check_batch(checker, pairs):
+            result['worker'] = worker_id
+            results.append((key, result))
+            queue.heartbeat(name)
+
+        queue.complete(name, results)
+        processed += 1
+        print(f"[{worker_id}] finished {name} ({len(pairs)} pairs)")
+
+
+def merge_results(queue_root, output_path):
+    """
+    Stream partial results shard by shard into a single JSON Lines file,
+    one [key, result] array per line.
+
+    Returns:
+        Dictionary of result counts
+    """
+    counts = {'total': 0, 'aligned': 0, 'misaligned': 0, 'errors': 0}
+    with open(output_path, 'w') as f:
+        for key, result in ShardQueue(queue_root).iter_results():
+            f.write(json.dumps([key, result]) + '\n')
+            counts['total'] += 1
+            if 'error' in result:
+                counts['errors'] += 1
+            elif result.get('is_aligned'):
+                counts['aligned'] += 1
+            else:
+                counts['misaligned'] += 1
+
+    print(f"Merged {counts['total']} results: {counts['aligned']} aligned, "
+          f"{counts['misaligned']} misaligned, {counts['errors']} errors")
+    return counts
+
+
+def read_results(path):
+    """Yield (key, result) tuples from a file written by merge_results"""
+    with open(path) as f:
+        for line in f:
+            key, result = json.loads(line)
+            yield key, result
+
+
+def run_local(manifest_path, queue_root, output_path, workers=4, shard_size=100, lease_timeout=300.0, checker_kwargs=None,
+              max_attempts=3):
+    """Split a manifest, process it with local worker processes and merge the results"""
+    ShardQueue(queue_root).create(read_manifest(manifest_path), shard_size, checker_kwargs)
+
+    processes = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(queue_root, f"local-{index}", lease_timeout),
+            kwargs={'max_attempts': max_attempts},
+        )
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    return merge_results(queue_root, output_path)
+
+
+def _add_checker_arguments(parser):
+    """Checker settings stored in the queue when it is created"""
+    parser.add_argument('--checkerboard-size', type=int, nargs=2, metavar=('ROWS', 'COLS'), default=(7, 7))
+    parser.add_argument('--pattern-type', choices=PATTERN_TYPES, default='checkerboard')
+    parser.add_argument('--max-rotation-error', type=float, default=5.0)
+    parser.add_argument('--max-scale-difference', type=float, default=0.1)
+    parser.add_argument('--max-position-ratio-diff', type=float, default=0.1)
+    parser.add_argument('--min-visible-corners', type=int, default=6)
+
+
+def _checker_kwargs(args):
+    """AlignmentChecker keyword arguments from parsed checker arguments"""
+    return {
+        'checkerboard_size': tuple(args.checkerboard_size),
+        'pattern_type': args.pattern_type,
+        'max_rotation_error': args.max_rotation_error,
+        'max_scale_difference': args.max_scale_difference,
+        'max_position_ratio_diff': args.max_position_ratio_diff,
+        'min_visible_corners': args.min_visible_corners,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded batch runner for alignment checks")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    split_parser = subparsers.add_parser('split', help="split a manifest into shards")
+    split_parser.add_argument('manifest')
+    split_parser.add_argument('queue_root')
+    split_parser.add_argument('--shard-size', type=int, default=100)
+    _add_checker_arguments(split_parser)
+
+    work_parser = subparsers.add_parser('work', help="process shards until the queue is drained")
+    work_parser.add_argument('queue_root')
+    work_parser.add_argument('--worker-id')
+    work_parser.add_argument('--lease-timeout', type=float, default=300.0)
+    work_parser.add_argument('--max-attempts', type=int, default=3)
+
+    merge_parser = subparsers.add_parser('merge', help="merge partial results into a JSON Lines file")
+    merge_parser.add_argument('queue_root')
+    merge_parser.add_argument('output')
+
+    local_parser = subparsers.add_parser('local', help="split, run local workers and merge")
+    local_parser.add_argument('manifest')
+    local_parser.add_argument('queue_root')
+    local_parser.add_argument('output')
+    local_parser.add_argument('--workers', type=int, default=4)
+    local_parser.add_argument('--shard-size', type=int, default=100)
+    local_parser.add_argument('--lease-timeout', type=float, default=300.0)
+    local_parser.add_argument('--max-attempts', type=int, default=3)
+    _add_checker_arguments(local_parser)
+
+    args = parser.parse_args()
+    if args.command == 'split':
+        names = ShardQueue(args.queue_root).create(read_manifest(args.manifest), args.shard_size,
+                                                   _checker_kwargs(args))
+        print(f"Created {len(names)} shards in {args.queue_root}")
+    elif args.command == 'work':
+        run_worker(args.queue_root, args.worker_id, args.lease_timeout, max_attempts=args.max_attempts)
+    elif args.command == 'merge':
+        merge_results(args.queue_root, args.output)
+    elif args.command == 'local':
+        run_local(args.manifest, args.queue_root, args.output, args.workers, args.shard_size, args.lease_timeout,
+                  _checker_kwargs(args), args.max_attempts)
+
+
+if __name__ == "__main__":
+    main()
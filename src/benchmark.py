@@ -0,0 +1,270 @@
+# benchmark.py
+import time
+import cv2
+import numpy as np
+from checker import AlignmentChecker
+from reference_profile import ReferenceProfile
+from generate_checkerboard import PATTERN_TYPES, CheckerboardDisplay
+from threshold_analysis import CRITERIA, ThresholdAnalyzer
+
+
+def _time_call(func, repeats):
+    """Return (result of last call, mean time in milliseconds)"""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = func()
+    return result, (time.perf_counter() - start) * 1000 / repeats
+
+
+def _refinement_scenes(reference_path, checkerboard_size, square_size, scales):
+    """
+    Build test images with exactly known corners from the reference screenshot.
+
+    Ground truth is the analytic ReferenceProfile of the generated board.
+    Every scale is used once as a plain downscale (INTER_AREA keeps pixel
+    centers at (p + 0.5) * scale - 0.5) and once behind a fixed perspective
+    warp, whose homography is applied to the ground truth as well.
+
+    Yields:
+        Tuples of (name, image, ground truth corners as an (N, 2) array)
+    """
+    screen = cv2.imread(reference_path, cv2.IMREAD_GRAYSCALE)
+    if screen is None:
+        raise ValueError(f"Could not load {reference_path}")
+    height, width = screen.shape
+    truth = ReferenceProfile.from_pattern(checkerboard_size, square_size, (width, height)).corners.reshape(-1, 2)
+
+    for scale in scales:
+        image = cv2.resize(screen, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        scaled_truth = (truth + 0.5) * scale - 0.5
+        yield f"screen@{scale:g}", image, scaled_truth
+
+        h, w = image.shape
+        source = np.float32([[0, 0], [w, 0], [w, h], [0, h]])
+        target = source + np.float32([[0.04, 0.03], [-0.05, 0.01], [-0.02, -0.04], [0.03, -0.02]]) * np.float32([w, h])
+        homography = cv2.getPerspectiveTransform(source, target)
+        warped = cv2.warpPerspective(image, homography, (w, h), flags=cv2.INTER_LINEAR, borderValue=40)
+        warped_truth = cv2.perspectiveTransform(scaled_truth.reshape(-1, 1, 2).astype(np.float64), homography)
+        yield f"perspective@{scale:g}", warped, warped_truth.reshape(-1, 2)
+
+
+def benchmark_refinement(reference_path='reference_screen.png', checkerboard_size=(7,7), square_size=100,
+                         scales=(1.0, 0.5, 0.25, 0.1, 0.07, 0.05), repeats=20):
+    """
+    Compare sub-pixel refinement strategies against ground truth corners.
+
+    The reference screenshot is downscaled (and perspective-warped) so the
+    true corner positions are known exactly; the smallest scales show where
+    a window small enough to fit the squares stops adding accuracy.
+
+    Returns:
+        Dictionary mapping scene name to per-strategy timing and accuracy
+    """
+    checker = AlignmentChecker(checkerboard_size=checkerboard_size, visualize=False)
+    stats_checker = AlignmentChecker(checkerboard_size=checkerboard_size, visualize=False,
+                                     collect_refinement_stats=True)
+    results = {}
+
+    for key, image, truth in _refinement_scenes(reference_path, checkerboard_size, square_size, scales):
+        ret, coarse = cv2.findChessboardCorners(image, checkerboard_size, None)
+        if not ret:
+            print(f"{key}: no checkerboard found, skipped")
+            continue
+
+        # Detection order may differ from the profile's, so match by proximity
+        distances = np.linalg.norm(coarse.reshape(-1, 1, 2) - truth.reshape(1, -1, 2), axis=2)
+        matched_truth = truth[np.argmin(distances, axis=1)]
+
+        fixed_criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+        strategies = {
+            'none': lambda: coarse,
+            'fixed_11x11': lambda: cv2.cornerSubPix(image, coarse.copy(), (11,11), (-1,-1), fixed_criteria),
+            'adaptive': lambda: checker._refine_corners(image, coarse)[0],
+            'adaptive+stats': lambda: stats_checker._refine_corners(image, coarse)[0],
+        }
+
+        results[key] = {}
+        for name, refine in strategies.items():
+            corners, elapsed_ms = _time_call(refine, repeats)
+            error = np.linalg.norm(corners.reshape(-1, 2) - matched_truth, axis=1)
+            results[key][name] = {
+                'time_ms': elapsed_ms,
+                'mean_error_px': float(np.mean(error)),
+                'max_error_px': float(np.max(error)),
+            }
+
+        stats = stats_checker._refine_corners(image, coarse)[1]
+        results[key]['adaptive']['window_size'] = stats['window_size']
+        results[key]['adaptive']['max_iterations'] = stats['max_iterations']
+        results[key]['adaptive']['converged_ratio'] = stats['converged_ratio']
+
+    _print_refinement_results(results)
+    return results
+
+
+def _print_refinement_results(results):
+    """Print refinement benchmark table"""
+    print(f"\n{'Image':<28}{'Strategy':<16}{'Time (ms)':>10}{'Mean err':>10}{'Max err':>10}")
+    for key, strategies in results.items():
+        for name, row in strategies.items():
+            print(f"{key:<28}{name:<16}{row['time_ms']:>10.3f}"
+                  f"{row['mean_error_px']:>10.4f}{row['max_error_px']:>10.4f}")
+        adaptive = strategies['adaptive']
+        print(f"{'':<28}adaptive window {adaptive['window_size']}, "
+              f"{adaptive['max_iterations']} iterations, converged {adaptive['converged_ratio']:.0%}")
+
+
+def benchmark_threshold_sweep(captures=1_000_000, grid_size=21, repeats=5):
+    """Time a full threshold grid sweep over synthetic stored differences"""
+    rng = np.random.default_rng(0)
+    scales = {'rotation_error': 3.0}
+    differences = {
+        name: np.abs(rng.normal(0, scales.get(name, 0.05), captures))
+        for names in CRITERIA.values() for name in names
+    }
+    analyzer = ThresholdAnalyzer(differences, rng.random(captures) > 0.02)
+
+    position = np.linspace(0, 0.2, grid_size)
+    rotation = np.linspace(0, 10, grid_size)
+    scale = np.linspace(0, 0.2, grid_size)
+    _, elapsed_ms = _time_call(lambda: analyzer.sweep(position, rotation, scale), repeats)
+
+    print(f"\nThreshold sweep: {captures} captures x {grid_size ** 3} combinations in {elapsed_ms:.1f} ms")
+    return elapsed_ms
+
+
+def _synthetic_capture(pattern, rng, screen_size=(1280, 720), occlude=False, glare=False):
+    """
+    Place a pattern on a simulated screen seen under a random perspective.
+
+    Returns:
+        Tuple of (capture, screen-to-capture homography)
+    """
+    screen_width, screen_height = screen_size
+    height, width = pattern.shape
+    x0, y0 = (screen_width - width) // 2, (screen_height - height) // 2
+
+    screen = np.full((screen_height, screen_width), 240, dtype=np.uint8)
+    screen[y0:y0 + height, x0:x0 + width] = pattern
+
+    source = np.float32([[0, 0], [screen_width, 0], [screen_width, screen_height], [0, screen_height]])
+    target = source + rng.uniform(-40, 40, source.shape).astype(np.float32)
+    homography = cv2.getPerspectiveTransform(source, target)
+    capture = cv2.warpPerspective(screen, homography, screen_size, borderValue=40)
+
+    if occlude:
+        # Cover roughly one and a half squares somewhere on the board
+        size = int(width / 8 * 1.5)
+        ox = int(rng.uniform(x0, x0 + width - size))
+        oy = int(rng.uniform(y0, y0 + height - size))
+        cv2.rectangle(capture, (ox, oy), (ox + size, oy + size), 90, -1)
+
+    if glare:
+        # Saturating highlight of about two squares across
+        gx = rng.uniform(x0, x0 + width)
+        gy = rng.uniform(y0, y0 + height)
+        yy, xx = np.mgrid[0:screen_height, 0:screen_width]
+        highlight = 400 * np.exp(-((xx - gx) ** 2 + (yy - gy) ** 2) / (2 * (width / 8) ** 2))
+        capture = np.clip(capture + highlight, 0, 255).astype(np.uint8)
+
+    return cv2.GaussianBlur(capture, (3, 3), 0), homography
+
+
+def benchmark_targets(trials=20, square_size=50, checkerboard_size=(7,7), seed=0):
+    """
+    Compare detection latency and success rate of the target types on
+    synthetic captures: clean, partially occluded and with glare.
+
+    Returns:
+        Dictionary mapping (pattern type, scenario) to success rate and latency
+    """
+    scenarios = {
+        'clean': {},
+        'occluded': {'occlude': True},
+        'glare': {'glare': True},
+    }
+    results = {}
+
+    for pattern_type in PATTERN_TYPES:
+        pattern = CheckerboardDisplay(checkerboard_size, square_size, pattern_type).generate_pattern()
+        checker = AlignmentChecker(checkerboard_size=checkerboard_size, pattern_type=pattern_type,
+                                   visualize=False, verbose=False)
+
+        for scenario, options in scenarios.items():
+            rng = np.random.default_rng(seed)
+            captures = [_synthetic_capture(pattern, rng, **options)[0] for _ in range(trials)]
+            successes = 0
+            start = time.perf_counter()
+            for capture in captures:
+                try:
+                    checker.find_corners(capture)
+                    successes += 1
+                except ValueError:
+                    pass
+            results[(pattern_type, scenario)] = {
+                'success_rate': successes / trials,
+                'time_ms': (time.perf_counter() - start) * 1000 / trials,
+            }
+
+    print(f"\n{'Target':<14}{'Scenario':<10}{'Success':>9}{'Time (ms)':>11}")
+    for (pattern_type, scenario), row in results.items():
+        print(f"{pattern_type:<14}{scenario:<10}{row['success_rate']:>9.0%}{row['time_ms']:>11.2f}")
+    return results
+
+
+def benchmark_charuco_refinement(trials=30, square_sizes=(50, 30, 20), checkerboard_size=(7,7), seed=0,
+                                 screen_size=(1280, 720)):
+    """
+    Corner accuracy of ChArUco detection with and without the extra
+    cornerSubPix pass, against the analytic corners of the generated board
+    mapped through the known capture homography.
+
+    Returns:
+        Dictionary mapping (square size, strategy) to mean/max error and latency
+    """
+    strategies = {'detector': False, 'detector+refine': True}
+    results = {}
+
+    for square_size in square_sizes:
+        pattern = CheckerboardDisplay(checkerboard_size, square_size, 'charuco').generate_pattern()
+        screen_corners = ReferenceProfile.from_pattern(checkerboard_size, square_size, screen_size).corners
+        rng = np.random.default_rng(seed)
+        captures = [_synthetic_capture(pattern, rng, screen_size) for _ in range(trials)]
+
+        for name, refine in strategies.items():
+            checker = AlignmentChecker(checkerboard_size=checkerboard_size, pattern_type='charuco',
+                                       refine_corners=refine, visualize=False, verbose=False)
+            errors = []
+            elapsed = 0.0
+            for capture, homography in captures:
+                start = time.perf_counter()
+                try:
+                    corners, _ = checker.find_corners(capture)
+                except ValueError:
+                    continue
+                elapsed += time.perf_counter() - start
+                truth = cv2.perspectiveTransform(screen_corners.astype(np.float64), homography)
+                errors.append(np.linalg.norm((corners - truth)[:, 0], axis=1))
+
+            if not errors:
+                print(f"{square_size}px {name}: no board found, skipped")
+                continue
+            errors = np.concatenate(errors)
+            results[(square_size, name)] = {
+                'mean_error_px': float(np.mean(errors)),
+                'max_error_px': float(np.max(errors)),
+                'time_ms': elapsed * 1000 / (len(errors) // len(screen_corners)),
+            }
+
+    print(f"\n{'Square':<8}{'Strategy':<18}{'Mean err':>10}{'Max err':>10}{'Time (ms)':>11}")
+    for (square_size, name), row in results.items():
+        print(f"{square_size:<8}{name:<18}{row['mean_error_px']:>10.4f}{row['max_error_px']:>10.4f}"
+              f"{row['time_ms']:>11.2f}")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_refinement()
+    benchmark_threshold_sweep()
+    benchmark_targets()
+    benchmark_charuco_refinement()
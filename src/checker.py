@@ -3,45 +3,237 @@ import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 from visualizer import AlignmentVisualizer
+from reference_profile import ReferenceProfile
+from generate_checkerboard import PATTERN_TYPES, create_charuco_board
 
 class AlignmentChecker:
-    def __init__(self, checkerboard_size=(7,7), max_rotation_error=5.0, max_scale_difference=0.1):
+    def __init__(self, checkerboard_size=(7,7), max_rotation_error=5.0, max_scale_difference=0.1,
+                 max_position_ratio_diff=0.1, refine_corners=True, visualize=True, verbose=True,
+                 pattern_type='checkerboard', min_visible_corners=6, collect_refinement_stats=False):
+        if pattern_type not in PATTERN_TYPES:
+            raise ValueError(f"Unknown pattern type: {pattern_type}")
+        if min_visible_corners < 4:
+            raise ValueError("min_visible_corners must be at least 4 to fit the board homography")
         self.checkerboard_size = checkerboard_size
         self.max_rotation_error = max_rotation_error
         self.max_scale_difference = max_scale_difference
+        self.max_position_ratio_diff = max_position_ratio_diff
+        self.refine_corners = refine_corners
+        self.visualize = visualize
+        self.verbose = verbose
+        self.pattern_type = pattern_type
+        self.min_visible_corners = min_visible_corners
+        self.collect_refinement_stats = collect_refinement_stats
+        self.refinement_stats = None
+        self.corner_coverage = None
         self.visualizer = AlignmentVisualizer(checkerboard_size)
+        
+        if pattern_type == 'charuco':
+            self.charuco_board = create_charuco_board(checkerboard_size)
+            self.charuco_detector = cv2.aruco.CharucoDetector(self.charuco_board)
 
     def find_corners(self, image):
         """Find checkerboard corners in the image"""
-        if isinstance(image, str):
-            image = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
-            
-        if image is None:
-            raise ValueError("Could not load image")
-            
+        image = self._load_image(image)
         self.image_height, self.image_width = image.shape
         
         # Show original image
-        plt.figure(figsize=(12, 8))
-        plt.imshow(image, cmap='gray')
-        plt.title("Original Image")
-        plt.axis('on')
-        plt.show()
+        if self.visualize:
+            plt.figure(figsize=(12, 8))
+            plt.imshow(image, cmap='gray')
+            plt.title("Original Image")
+            plt.axis('on')
+            plt.show()
         
         # Find corners
-        ret, corners = cv2.findChessboardCorners(image, self.checkerboard_size, None)
-        if not ret:
-            raise ValueError("Could not find checkerboard corners in image")
+        self.refinement_stats = None
+        if self.pattern_type == 'circles':
+            corners = self._find_circle_centers(image)
+        elif self.pattern_type == 'charuco':
+            corners = self._find_charuco_corners(image)
+        else:
+            ret, corners = cv2.findChessboardCorners(image, self.checkerboard_size, None)
+            if not ret:
+                raise ValueError("Could not find checkerboard corners in image")
+            self.corner_coverage = 1.0
             
-        # Refine corner positions
-        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
-        corners = cv2.cornerSubPix(image, corners, (11,11), (-1,-1), criteria)
+            # Refine corner positions (skipped when only coarse verdicts are needed)
+            if self.refine_corners:
+                corners, self.refinement_stats = self._refine_corners(image, corners)
         
         # Visualize detected corners
-        self.visualizer.draw_corners(image, corners, "Detected Corners")
+        if self.visualize:
+            self.visualizer.draw_corners(image, corners, "Detected Corners")
         
         return corners, image  
 
+    def _find_circle_centers(self, image):
+        """
+        Find the circle grid centers. Blob centroids are already sub-pixel
+        accurate, so no corner refinement is needed.
+        """
+        ret, centers = cv2.findCirclesGrid(image, self.checkerboard_size, flags=cv2.CALIB_CB_SYMMETRIC_GRID)
+        if not ret:
+            raise ValueError("Could not find circle grid in image")
+        self.corner_coverage = 1.0
+        return centers
+
+    def _find_charuco_corners(self, image):
+        """
+        Find ChArUco corners. Every corner is identified by its marker, so
+        a partially occluded board still yields a usable subset, which is
+        completed to the full grid.
+        """
+        charuco_corners, charuco_ids, _, _ = self.charuco_detector.detectBoard(image)
+        if charuco_ids is None or len(charuco_ids) < self.min_visible_corners:
+            raise ValueError("Could not find enough ChArUco corners in image")
+        
+        ids = charuco_ids.ravel()
+        corners = self._complete_corner_grid(charuco_corners, ids)
+        
+        # The detector's corners come out about half a pixel off the true grid
+        # (0.7 px mean error, see benchmark_charuco_refinement), so the visible
+        # corners go through the usual refinement as well
+        if self.refine_corners:
+            refined, self.refinement_stats = self._refine_corners(
+                image, charuco_corners, self._estimate_square_pitch(corners))
+            corners = self._complete_corner_grid(refined, ids)
+        
+        self.corner_coverage = len(ids) / len(corners)
+        return corners
+
+    def _complete_corner_grid(self, corners, ids):
+        """
+        Fill in the corners missing from a partial detection.
+        
+        A homography from the board layout to the image is fitted on the
+        visible corners and used to project the hidden ones, so the metrics
+        always see a full grid in findChessboardCorners order. Detected
+        corners keep their measured positions.
+        
+        Args:
+            corners: Detected corners, shape (N, 1, 2)
+            ids: Row-major grid index of each detected corner
+            
+        Returns:
+            Full corner grid, shape (rows * cols, 1, 2)
+        """
+        rows, cols = self.checkerboard_size
+        grid_x, grid_y = np.meshgrid(np.arange(cols, dtype=np.float32), np.arange(rows, dtype=np.float32))
+        layout = np.stack([grid_x, grid_y], axis=-1).reshape(-1, 2)
+        
+        homography, _ = cv2.findHomography(layout[ids], corners.reshape(-1, 2), cv2.RANSAC, 3.0)
+        if homography is None:
+            raise ValueError("Could not fit the board to the visible corners")
+        
+        full = cv2.perspectiveTransform(layout.reshape(-1, 1, 2), homography).astype(np.float32)
+        full[ids] = corners.reshape(-1, 1, 2)
+        return full
+
+    def _load_image(self, image):
+        """Load a grayscale image from a path, or pass an array through"""
+        if isinstance(image, str):
+            image = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+            
+        if image is None:
+            raise ValueError("Could not load image")
+        
+        return image
+
+    def _estimate_square_pitch(self, corners):
+        """Estimate the median distance in pixels between neighbouring corners"""
+        grid = corners.reshape(self.checkerboard_size[0], self.checkerboard_size[1], 2)
+        row_steps = np.linalg.norm(np.diff(grid, axis=1), axis=2)
+        col_steps = np.linalg.norm(np.diff(grid, axis=0), axis=2)
+        return float(np.median(np.concatenate([row_steps.ravel(), col_steps.ravel()])))
+
+    def _refinement_params(self, square_pitch):
+        """
+        Pick the cornerSubPix window and iteration budget from the square pitch.
+        
+        The search window has to stay inside the squares touching the corner,
+        otherwise neighbouring corners leak into the gradient sums. Small boards
+        get a small window, whose estimate moves further per iteration and so
+        gets the larger budget; large boards get a wider window (capped, as more
+        pixels stop adding accuracy) that settles in a few iterations.
+        
+        Returns:
+            Tuple of (half window size, termination criteria)
+        """
+        half_window = int(np.clip(round(square_pitch * 0.3), 2, 11))
+        max_iterations = int(np.clip(34 - 2 * half_window, 10, 30))
+        criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, max_iterations, 0.001)
+        return half_window, criteria
+
+    def _refine_corners(self, image, corners, square_pitch=None):
+        """
+        Refine corners to sub-pixel accuracy with a window scaled to the board.
+        
+        Args:
+            image: Grayscale image
+            corners: Coarse corners from findChessboardCorners
+            square_pitch: Square pitch in pixels, estimated from corners if not given
+            
+        Returns:
+            Tuple of (refined corners, refinement statistics dictionary). The
+            per-corner shift, convergence and quality are only included when
+            collect_refinement_stats is set, as they cost more than the
+            refinement itself.
+        """
+        if square_pitch is None:
+            square_pitch = self._estimate_square_pitch(corners)
+        half_window, criteria = self._refinement_params(square_pitch)
+        window = (half_window, half_window)
+        
+        refined = cv2.cornerSubPix(image, corners.copy(), window, (-1,-1), criteria)
+        
+        stats = {
+            'square_pitch': square_pitch,
+            'window_size': (2 * half_window + 1, 2 * half_window + 1),
+            'max_iterations': criteria[1],
+        }
+        if not self.collect_refinement_stats:
+            return refined, stats
+        
+        # One extra iteration from the refined position tells us whether each
+        # corner actually settled or just ran out of iterations. cornerSubPix
+        # treats the termination epsilon as a step length in pixels.
+        probe_criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 1, criteria[2])
+        probe = cv2.cornerSubPix(image, refined.copy(), window, (-1,-1), probe_criteria)
+        
+        shift = np.linalg.norm((refined - corners)[:,0], axis=1)
+        residual = np.linalg.norm((probe - refined)[:,0], axis=1)
+        converged = residual <= criteria[2]
+        
+        stats.update({
+            'shift': shift,
+            'residual': residual,
+            'converged': converged,
+            'quality': self._corner_quality(image, refined, 2 * half_window + 1),
+            'converged_ratio': float(np.mean(converged)),
+        })
+        
+        return refined, stats
+
+    def _corner_quality(self, image, corners, window_size):
+        """
+        Corner strength as the mean minimum eigenvalue of the gradient
+        structure tensor in the refinement window around each corner.
+        Blurred or washed-out corners score close to zero.
+        """
+        patches = np.stack([
+            cv2.getRectSubPix(image, (window_size, window_size), (float(x), float(y)))
+            for x, y in corners[:,0]
+        ]).astype(np.float32)
+        
+        gy, gx = np.gradient(patches, axis=(1, 2))
+        ixx = np.sum(gx * gx, axis=(1, 2))
+        iyy = np.sum(gy * gy, axis=(1, 2))
+        ixy = np.sum(gx * gy, axis=(1, 2))
+        min_eigenvalue = 0.5 * (ixx + iyy - np.sqrt((ixx - iyy) ** 2 + 4 * ixy ** 2))
+        
+        return min_eigenvalue / (window_size * window_size)
+
     def _check_screen_borders(self, image, threshold=30):
         """
         Check for dark borders in the image that might indicate monitor bezels.
@@ -92,11 +284,12 @@ class AlignmentChecker:
     
     def calculate_pattern_metrics(self, corners, image):
         """Calculate pattern metrics from corners"""
-        metrics = self._calculate_basic_metrics(corners, image)
-        self.visualizer.draw_bounds(image, corners, metrics, "Pattern Bounds")
+        metrics = self._calculate_basic_metrics(corners, image.shape)
+        if self.visualize:
+            self.visualizer.draw_bounds(image, corners, metrics, "Pattern Bounds")
         return metrics
 
-    def _calculate_basic_metrics(self, corners, image):
+    def _calculate_basic_metrics(self, corners, image_shape):
         """Calculate basic pattern metrics"""
         metrics = {
             'min_x': np.min(corners[:,:,0]),
@@ -108,33 +301,167 @@ class AlignmentChecker:
         # Calculate distances and dimensions
         metrics.update({
             'left_distance': metrics['min_x'],
-            'right_distance': image.shape[1] - metrics['max_x'],
+            'right_distance': image_shape[1] - metrics['max_x'],
             'top_distance': metrics['min_y'],
-            'bottom_distance': image.shape[0] - metrics['max_y'],
+            'bottom_distance': image_shape[0] - metrics['max_y'],
             'pattern_width': metrics['max_x'] - metrics['min_x'],
             'pattern_height': metrics['max_y'] - metrics['min_y'],
         })
         
         # Calculate ratios
         metrics.update({
-            'width_ratio': metrics['pattern_width'] / image.shape[1],
-            'height_ratio': metrics['pattern_height'] / image.shape[0],
+            'width_ratio': metrics['pattern_width'] / image_shape[1],
+            'height_ratio': metrics['pattern_height'] / image_shape[0],
             'horizontal_ratio': metrics['left_distance'] / (metrics['left_distance'] + metrics['right_distance']),
             'vertical_ratio': metrics['top_distance'] / (metrics['top_distance'] + metrics['bottom_distance']),
-            'image_width': image.shape[1],
-            'image_height': image.shape[0]
+            'image_width': image_shape[1],
+            'image_height': image_shape[0]
         })
         
         return metrics
 
+    def reference_profile(self, square_size=100, screen_size=None, cache_path=None):
+        """
+        Build the reference corners and metrics analytically from the
+        generator parameters, so no reference capture or detection is needed.
+        
+        Args:
+            square_size: Square size passed to CheckerboardDisplay
+            screen_size: Screen resolution as (width, height), defaults to the current screen
+            cache_path: Optional JSON file the profile is loaded from and saved to
+            
+        Returns:
+            ReferenceProfile that can be passed to check_alignment as the reference
+        """
+        if screen_size is None:
+            import pyautogui
+            screen_size = tuple(pyautogui.size())
+        
+        if cache_path is not None:
+            profile = ReferenceProfile.load(cache_path)
+            if profile is not None and profile.matches(self.checkerboard_size, square_size, screen_size):
+                return profile
+        
+        profile = ReferenceProfile.from_pattern(self.checkerboard_size, square_size, screen_size)
+        profile.metrics = self._calculate_basic_metrics(profile.corners, profile.image_shape)
+        
+        if cache_path is not None:
+            profile.save(cache_path)
+        
+        return profile
+
     def check_alignment(self, reference_image_path, test_image_path):
-        """Check alignment between reference and test images"""
-        # Find corners in both images
-        ref_corners, ref_image = self.find_corners(reference_image_path)
+        """
+        Check alignment between reference and test images.
+        
+        The reference can be an image path, an image array or a
+        ReferenceProfile from reference_profile().
+        """
+        reference = self._prepare_reference(reference_image_path)
+        return self._check_against_reference(reference, test_image_path)
+
+    def check_alignment_burst(self, reference_image_path, frames, top_k=3):
+        """
+        Check alignment using the sharpest frame of a capture burst.
+        
+        All frames are ranked with a cheap focus measure and corner detection
+        only runs on the top_k candidates, best first, stopping at the first
+        one where the checkerboard is found. Frames that cannot be read score
+        -inf and are never tried.
+        
+        Args:
+            reference_image_path: Reference image path, array or ReferenceProfile
+            frames: List of test image paths or grayscale arrays
+            top_k: Maximum number of frames to run detection on
+            
+        Returns:
+            check_alignment result with an extra 'burst' entry holding the
+            selected frame index, the focus score of every frame, the frames
+            that were tried and the frames that could not be read
+        """
+        if not frames:
+            raise ValueError("Burst contains no frames")
+        
+        reference = self._prepare_reference(reference_image_path)
+        focus_scores = []
+        unreadable = []
+        for index, frame in enumerate(frames):
+            try:
+                focus_scores.append(self.focus_score(frame))
+            except ValueError:
+                focus_scores.append(float('-inf'))
+                unreadable.append(index)
+        
+        if len(unreadable) == len(frames):
+            raise ValueError("Could not load any frame of the burst")
+        readable = [index for index in np.argsort(focus_scores)[::-1] if index not in unreadable]
+        candidates = readable[:top_k]
+        
+        attempted = []
+        for index in candidates:
+            attempted.append(int(index))
+            try:
+                result = self._check_against_reference(reference, frames[index])
+            except ValueError as e:
+                if self.verbose:
+                    print(f"Frame {index} (focus {focus_scores[index]:.1f}) skipped: {e}")
+                continue
+            
+            result['burst'] = {
+                'selected_frame': int(index),
+                'focus_scores': focus_scores,
+                'attempted_frames': attempted,
+                'unreadable_frames': unreadable,
+            }
+            return result
+        
+        raise ValueError(f"Could not find checkerboard corners in the {len(candidates)} sharpest frames")
+
+    def focus_score(self, image, max_side=320):
+        """
+        Cheap sharpness measure: variance of the Laplacian on a downsampled
+        copy of the image. Blurred frames score low.
+        
+        Paths are decoded at reduced resolution (JPEG decoding skips most of
+        the work), as the score only has to rank the frames of one burst.
+        """
+        if isinstance(image, str):
+            image = cv2.imread(image, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        image = self._load_image(image)
+        scale = max_side / max(image.shape)
+        if scale < 1:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return float(cv2.Laplacian(image, cv2.CV_64F).var())
+
+    def _prepare_reference(self, reference):
+        """
+        Find the reference corners and metrics once.
+        
+        Returns:
+            Tuple of (corners, metrics, refinement statistics)
+        """
+        if isinstance(reference, ReferenceProfile):
+            if reference.checkerboard_size != tuple(self.checkerboard_size):
+                raise ValueError(f"Reference profile is for a {reference.checkerboard_size} checkerboard, "
+                                 f"checker expects {tuple(self.checkerboard_size)}")
+            # Profiles saved straight from ReferenceProfile.from_pattern carry no metrics
+            if not reference.metrics:
+                reference.metrics = self._calculate_basic_metrics(reference.corners, reference.image_shape)
+            return reference.corners, reference.metrics, None
+        
+        ref_corners, ref_image = self.find_corners(reference)
+        ref_refinement = self.refinement_stats
+        ref_metrics = self.calculate_pattern_metrics(ref_corners, ref_image)
+        return ref_corners, ref_metrics, ref_refinement
+
+    def _check_against_reference(self, reference, test_image_path):
+        """Check a test image against a reference from _prepare_reference"""
+        ref_corners, ref_metrics, ref_refinement = reference
         test_corners, test_image = self.find_corners(test_image_path)
+        test_refinement = self.refinement_stats
+        test_corner_coverage = self.corner_coverage
         
         # Calculate metrics
-        ref_metrics = self.calculate_pattern_metrics(ref_corners, ref_image)
         test_metrics = self.calculate_pattern_metrics(test_corners, test_image)
 
         # Add border check for test image
@@ -149,9 +476,12 @@ class AlignmentChecker:
         alignment_status['no_screen_borders'] = not border_status['has_screen_borders']
         
         # Print results
-        self._print_alignment_results(differences, alignment_status, ref_metrics, test_metrics, border_status)
+        if self.verbose:
+            self._print_alignment_results(differences, alignment_status, ref_metrics, test_metrics, border_status)
         
-        return {**differences, **alignment_status, 'ref_metrics': ref_metrics, 'test_metrics': test_metrics, 'border_status': border_status}
+        return {**differences, **alignment_status, 'is_aligned': all(alignment_status.values()), 'ref_metrics': ref_metrics, 'test_metrics': test_metrics, 'border_status': border_status,
+                'ref_refinement': ref_refinement, 'test_refinement': test_refinement,
+                'test_corner_coverage': test_corner_coverage}
 
     def _calculate_differences(self, ref_corners, test_corners, ref_metrics, test_metrics):
         """Calculate differences between reference and test images"""
@@ -175,14 +505,15 @@ class AlignmentChecker:
             # Swap x and y coordinates if detected vertically
             test_vector = np.array([test_vector[1], test_vector[0]])
         
-        print(f"Reference vector: {ref_vector}")
-        print(f"Test vector: {test_vector}")
-        
         angle = np.arctan2(ref_vector[1], ref_vector[0]) - \
                 np.arctan2(test_vector[1], test_vector[0])
-        print(f"Angle: {angle}")
         rotation_error = np.abs(np.degrees(angle))
-        print(f"Rotation error: {rotation_error}")
+        
+        if self.verbose:
+            print(f"Reference vector: {ref_vector}")
+            print(f"Test vector: {test_vector}")
+            print(f"Angle: {angle}")
+            print(f"Rotation error: {rotation_error}")
         
         return {
             'horizontal_difference': horizontal_diff,
@@ -194,11 +525,9 @@ class AlignmentChecker:
 
     def _check_alignment_status(self, differences):
         """Check alignment status against thresholds"""
-        max_position_ratio_diff = 0.1
-        
         return {
-            'is_horizontal_aligned': differences['horizontal_difference'] <= max_position_ratio_diff,
-            'is_vertical_aligned': differences['vertical_difference'] <= max_position_ratio_diff,
+            'is_horizontal_aligned': differences['horizontal_difference'] <= self.max_position_ratio_diff,
+            'is_vertical_aligned': differences['vertical_difference'] <= self.max_position_ratio_diff,
             'is_rotation_aligned': differences['rotation_error'] <= self.max_rotation_error,
             'is_scale_aligned': (
                 differences['width_ratio_difference'] <= self.max_scale_difference and 
@@ -1,14 +1,35 @@
 import cv2
 import numpy as np
-import tkinter as tk
-from PIL import Image, ImageTk
-import pyautogui
 import time
 
+PATTERN_TYPES = ('checkerboard', 'circles', 'charuco')
+
+
+def create_charuco_board(checkerboard_size=(7,7), square_size=100):
+    """
+    ChArUco board with the same square layout as the plain checkerboard, so
+    its inner corners sit at the same places. Markers fill 70% of a square.
+    """
+    rows, cols = checkerboard_size
+    dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_250)
+    return cv2.aruco.CharucoBoard((cols + 1, rows + 1), square_size, square_size * 0.7, dictionary)
+
+
 class CheckerboardDisplay:
-    def __init__(self, checkerboard_size=(7,7), square_size=100):
+    def __init__(self, checkerboard_size=(7,7), square_size=100, pattern_type='checkerboard'):
+        if pattern_type not in PATTERN_TYPES:
+            raise ValueError(f"Unknown pattern type: {pattern_type}")
         self.checkerboard_size = checkerboard_size
         self.square_size = square_size
+        self.pattern_type = pattern_type
+
+    def generate_pattern(self):
+        """Generate the target image for the configured pattern type"""
+        if self.pattern_type == 'circles':
+            return self.generate_circle_grid()
+        if self.pattern_type == 'charuco':
+            return self.generate_charuco_board()
+        return self.generate_checkerboard()
         
     def generate_checkerboard(self):
         """Generate a checkerboard pattern"""
@@ -32,10 +53,39 @@ class CheckerboardDisplay:
         
         return img
 
+    def generate_circle_grid(self):
+        """
+        Generate a symmetric grid of black circles on white, one circle on
+        each inner corner position of the equivalent checkerboard
+        """
+        rows, cols = self.checkerboard_size
+        img = np.full((self.square_size * (rows + 1), self.square_size * (cols + 1)), 255, dtype=np.uint8)
+        
+        # Centers sit on square edges (half-pixel positions), drawn with 1 bit of sub-pixel precision
+        radius = int(round(self.square_size * 0.3 * 2))
+        for i in range(1, rows + 1):
+            for j in range(1, cols + 1):
+                center = (2 * j * self.square_size - 1, 2 * i * self.square_size - 1)
+                cv2.circle(img, center, radius, 0, -1, cv2.LINE_AA, shift=1)
+        
+        return img
+
+    def generate_charuco_board(self):
+        """Generate a ChArUco board with the checkerboard's square layout"""
+        rows, cols = self.checkerboard_size
+        board = create_charuco_board(self.checkerboard_size, self.square_size)
+        size = (self.square_size * (cols + 1), self.square_size * (rows + 1))
+        return board.generateImage(size, marginSize=0, borderBits=1)
+
     def display_and_capture(self):
-        """Display the checkerboard pattern and capture the screen automatically"""
-        # Generate the checkerboard
-        img = self.generate_checkerboard()
+        """Display the pattern and capture the screen automatically"""
+        # GUI dependencies are only needed for on-screen capture
+        import tkinter as tk
+        from PIL import Image, ImageTk
+        import pyautogui
+        
+        # Generate the pattern
+        img = self.generate_pattern()
         
         # Create tkinter window
         root = tk.Tk()
@@ -0,0 +1,82 @@
+# reference_profile.py
+import json
+import os
+import numpy as np
+
+
+class ReferenceProfile:
+    """
+    Reference corners and metrics of a generated checkerboard, computed from
+    the generator parameters instead of a captured reference screenshot.
+    """
+
+    def __init__(self, checkerboard_size, square_size, screen_size, corners, metrics=None):
+        self.checkerboard_size = tuple(checkerboard_size)
+        self.square_size = square_size
+        self.screen_size = tuple(screen_size)
+        self.corners = corners
+        self.metrics = metrics
+
+    @property
+    def image_shape(self):
+        """Shape of the equivalent reference screenshot as (height, width)"""
+        return (self.screen_size[1], self.screen_size[0])
+
+    @classmethod
+    def from_pattern(cls, checkerboard_size=(7,7), square_size=100, screen_size=(1920, 1080)):
+        """
+        Compute the inner corner grid of the board drawn by
+        CheckerboardDisplay.generate_checkerboard when shown fullscreen.
+
+        The board has (rows + 1) x (cols + 1) squares and is centered on the
+        screen. Corners are ordered row by row from the top-left, like
+        findChessboardCorners, and sit on the square edges, half a pixel
+        before the first pixel of the next square.
+        """
+        rows, cols = checkerboard_size
+        screen_width, screen_height = screen_size
+        board_width = square_size * (cols + 1)
+        board_height = square_size * (rows + 1)
+
+        if board_width > screen_width or board_height > screen_height:
+            raise ValueError("Checkerboard does not fit on the screen")
+
+        origin_x = (screen_width - board_width) // 2
+        origin_y = (screen_height - board_height) // 2
+
+        xs = origin_x + square_size * np.arange(1, cols + 1) - 0.5
+        ys = origin_y + square_size * np.arange(1, rows + 1) - 0.5
+        grid_x, grid_y = np.meshgrid(xs, ys)
+        corners = np.stack([grid_x, grid_y], axis=-1).reshape(-1, 1, 2).astype(np.float32)
+
+        return cls(checkerboard_size, square_size, screen_size, corners)
+
+    def matches(self, checkerboard_size, square_size, screen_size):
+        """Check whether the profile was built for the given parameters"""
+        return (self.checkerboard_size == tuple(checkerboard_size) and
+                self.square_size == square_size and
+                self.screen_size == tuple(screen_size))
+
+    def save(self, path):
+        """Save the profile as JSON"""
+        data = {
+            'checkerboard_size': list(self.checkerboard_size),
+            'square_size': self.square_size,
+            'screen_size': list(self.screen_size),
+            'corners': self.corners.reshape(-1, 2).tolist(),
+            'metrics': {key: float(value) for key, value in (self.metrics or {}).items()},
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """Load a profile saved with save(), or return None if there is none"""
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+
+        corners = np.array(data['corners'], dtype=np.float32).reshape(-1, 1, 2)
+        return cls(data['checkerboard_size'], data['square_size'], data['screen_size'],
+                   corners, data['metrics'] or None)
@@ -0,0 +1,166 @@
+# threshold_analysis.py
+import numpy as np
+
+# Difference fields each alignment criterion is checked against, mirroring
+# AlignmentChecker._check_alignment_status
+CRITERIA = {
+    'position': ('horizontal_difference', 'vertical_difference'),
+    'rotation': ('rotation_error',),
+    'scale': ('width_ratio_difference', 'height_ratio_difference'),
+}
+
+
+class ThresholdAnalyzer:
+    """
+    What-if analysis of alignment thresholds over stored differences.
+
+    A capture passes a criterion when every difference field of that
+    criterion is within the threshold, i.e. when the largest of them is.
+    Each capture is therefore reduced to one "required threshold" per
+    criterion, and a whole grid of threshold combinations is evaluated by
+    binning these requirements against the sorted thresholds and taking a
+    cumulative sum, without ever materializing a (grid x captures) array.
+    """
+
+    def __init__(self, differences, no_screen_borders=None, keys=None):
+        """
+        Args:
+            differences: Dictionary of difference field name to 1D array, one entry per capture
+            no_screen_borders: Optional boolean array; captures with visible borders never pass
+            keys: Optional capture identifiers, e.g. test image paths
+        """
+        self.differences = {name: np.asarray(values, dtype=np.float64) for name, values in differences.items()}
+        self.count = len(next(iter(self.differences.values())))
+        self.no_screen_borders = (np.ones(self.count, dtype=bool) if no_screen_borders is None
+                                  else np.asarray(no_screen_borders, dtype=bool))
+        self.keys = list(keys) if keys is not None else None
+
+        # Missing values (NaN) fail at every threshold
+        self.required = {
+            criterion: np.nan_to_num(np.max([self.differences[name] for name in fields], axis=0), nan=np.inf)
+            for criterion, fields in CRITERIA.items()
+        }
+
+    @classmethod
+    def from_results(cls, results):
+        """
+        Build an analyzer from check_alignment results.
+
+        Args:
+            results: Dictionary of key to result (e.g. merged batch results) or list of results.
+                     Results holding an 'error' are skipped.
+        """
+        items = results.items() if isinstance(results, dict) else enumerate(results)
+        items = [(key, result) for key, result in items if 'error' not in result]
+        if not items:
+            raise ValueError("No successful results to analyze")
+
+        fields = [name for names in CRITERIA.values() for name in names]
+        differences = {name: [result[name] for _, result in items] for name in fields}
+        no_screen_borders = [result.get('no_screen_borders', True) for _, result in items]
+        return cls(differences, no_screen_borders, [key for key, _ in items])
+
+    def save(self, path):
+        """Store the difference arrays as a .npz file"""
+        arrays = dict(self.differences, no_screen_borders=self.no_screen_borders)
+        if self.keys is not None:
+            arrays['keys'] = np.asarray([str(key) for key in self.keys])
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Load difference arrays stored with save()"""
+        with np.load(path) as data:
+            fields = [name for names in CRITERIA.values() for name in names]
+            differences = {name: data[name] for name in fields}
+            keys = data['keys'].tolist() if 'keys' in data else None
+            return cls(differences, data['no_screen_borders'], keys)
+
+    def _threshold_bins(self, criterion, thresholds):
+        """Index of the first (sorted) threshold each capture passes, len(thresholds) if none"""
+        return np.searchsorted(thresholds, self.required[criterion], side='left')
+
+    def sweep(self, position_thresholds, rotation_thresholds, scale_thresholds):
+        """
+        Evaluate pass rates over every combination of thresholds.
+
+        Returns:
+            Dictionary with the sorted threshold axes, the overall 'pass_rate'
+            grid of shape (position, rotation, scale) and the per-criterion
+            pass rates along each axis
+        """
+        axes = {
+            'position': np.sort(np.asarray(position_thresholds, dtype=np.float64)),
+            'rotation': np.sort(np.asarray(rotation_thresholds, dtype=np.float64)),
+            'scale': np.sort(np.asarray(scale_thresholds, dtype=np.float64)),
+        }
+        bins = {criterion: self._threshold_bins(criterion, axis) for criterion, axis in axes.items()}
+        shape = tuple(len(axis) + 1 for axis in axes.values())
+
+        # Count captures per (position, rotation, scale) bin, then a cumulative
+        # sum along each axis turns counts into "passes at these thresholds"
+        valid = self.no_screen_borders
+        flat = np.ravel_multi_index(tuple(bins[criterion][valid] for criterion in axes), shape)
+        counts = np.bincount(flat, minlength=np.prod(shape)).reshape(shape)
+        passed = counts.cumsum(axis=0).cumsum(axis=1).cumsum(axis=2)[:-1, :-1, :-1]
+
+        per_criterion = {
+            criterion: np.cumsum(np.bincount(bins[criterion], minlength=len(axes[criterion]) + 1))[:-1] / self.count
+            for criterion in axes
+        }
+
+        return {
+            'thresholds': axes,
+            'pass_rate': passed / self.count,
+            'criterion_pass_rate': per_criterion,
+            'border_pass_rate': float(np.mean(self.no_screen_borders)),
+        }
+
+    def yield_curve(self, criterion, thresholds, max_position_ratio_diff=0.1, max_rotation_error=5.0,
+                    max_scale_difference=0.1):
+        """
+        Overall pass rate while sweeping one criterion and keeping the others
+        at fixed thresholds.
+
+        Returns:
+            Tuple of (sorted thresholds, pass rate per threshold)
+        """
+        fixed = {
+            'position': max_position_ratio_diff,
+            'rotation': max_rotation_error,
+            'scale': max_scale_difference,
+        }
+        thresholds = np.sort(np.asarray(thresholds, dtype=np.float64))
+
+        others_pass = self.no_screen_borders.copy()
+        for other, threshold in fixed.items():
+            if other != criterion:
+                others_pass &= self.required[other] <= threshold
+
+        bins = self._threshold_bins(criterion, thresholds)[others_pass]
+        passed = np.cumsum(np.bincount(bins, minlength=len(thresholds) + 1))[:-1]
+        return thresholds, passed / self.count
+
+    def breakdown(self, max_position_ratio_diff=0.1, max_rotation_error=5.0, max_scale_difference=0.1):
+        """
+        Per-criterion pass rates at one set of thresholds, plus how many
+        captures fail only that criterion (the ones relaxing it would recover).
+        """
+        thresholds = {
+            'position': max_position_ratio_diff,
+            'rotation': max_rotation_error,
+            'scale': max_scale_difference,
+        }
+        passes = {criterion: self.required[criterion] <= threshold for criterion, threshold in thresholds.items()}
+        passes['borders'] = self.no_screen_borders
+        fail_counts = np.sum([~mask for mask in passes.values()], axis=0)
+
+        breakdown = {
+            criterion: {
+                'pass_rate': float(np.mean(mask)),
+                'only_failure': int(np.sum(~mask & (fail_counts == 1))),
+            }
+            for criterion, mask in passes.items()
+        }
+        breakdown['overall'] = {'pass_rate': float(np.mean(fail_counts == 0))}
+        return breakdown
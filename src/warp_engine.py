@@ -0,0 +1,222 @@
+# warp_engine.py
+import cv2
+import numpy as np
+
+
+class WarpDiffEngine:
+    """
+    Dense comparison of captures against the reference frame.
+
+    The test-to-reference perspective transform is estimated once per
+    station from all detected corners and baked into fixed-point remap
+    tables. Every new capture from that station is then brought onto the
+    reference frame with a single cv2.remap, with no corner detection, and
+    compared pixel by pixel. Areas where the screen or camera has moved
+    since the station was set up show up as hot regions in the heatmap.
+    """
+
+    def __init__(self, reference_image, reference_corners, checkerboard_size=(7,7), heatmap_scale=0.125,
+                 region_grid=(3, 3)):
+        """
+        Args:
+            reference_image: Grayscale reference image, defines the output frame
+            reference_corners: Corners detected in (or computed for) the reference
+            checkerboard_size: Checkerboard size the corners were found with
+            heatmap_scale: Downsampling factor of the error heatmap
+            region_grid: Number of (rows, cols) regions for the region statistics
+        """
+        self.reference_image = reference_image
+        self.reference_corners = reference_corners
+        self.checkerboard_size = checkerboard_size
+        self.heatmap_scale = heatmap_scale
+        self.region_grid = region_grid
+        self.reference_normalized = None
+        self.homography = None
+        self.test_shape = None
+        self.roi = None
+        self.map1 = None
+        self.map2 = None
+        self.valid_mask = None
+
+    def build_maps(self, test_corners, test_shape):
+        """
+        Estimate the test-to-reference transform and precompute the warp maps.
+
+        Args:
+            test_corners: Corners detected in a capture from the station
+            test_shape: Shape of the station's captures as (height, width)
+
+        Returns:
+            Dictionary describing the transform and its keystone distortion
+        """
+        test_corners = self._match_corner_order(test_corners)
+        homography, _ = cv2.findHomography(test_corners.reshape(-1, 2), self.reference_corners.reshape(-1, 2), 0)
+        if homography is None:
+            raise ValueError("Could not estimate perspective transform from corners")
+        self.homography = homography
+        self.test_shape = tuple(test_shape[:2])
+
+        # Only the board area is compared (the rest of the screen has no
+        # structure to align on), so maps are built for its bounding box only
+        board_mask = self._board_mask()
+        x, y, width, height = cv2.boundingRect(board_mask.astype(np.uint8))
+        self.roi = (x, y, width, height)
+
+        # remap pulls pixels, so each reference pixel needs its source location in the capture
+        grid_x, grid_y = np.meshgrid(np.arange(x, x + width, dtype=np.float32),
+                                     np.arange(y, y + height, dtype=np.float32))
+        points = np.stack([grid_x, grid_y], axis=-1).reshape(-1, 1, 2)
+        source = cv2.perspectiveTransform(points, np.linalg.inv(homography)).reshape(height, width, 2)
+
+        # Fixed-point maps make every later remap noticeably cheaper
+        self.map1, self.map2 = cv2.convertMaps(source[..., 0], source[..., 1], cv2.CV_16SC2)
+
+        # Board pixels the capture does not cover are left out of the statistics
+        coverage = cv2.remap(np.full(test_shape, 255, dtype=np.uint8), self.map1, self.map2,
+                             cv2.INTER_NEAREST, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        self.valid_mask = (coverage > 0) & board_mask[y:y + height, x:x + width]
+        self.reference_normalized = self._normalize(self.reference_image[y:y + height, x:x + width], self.valid_mask)
+
+        return self._describe_transform(test_corners)
+
+    def _describe_transform(self, test_corners):
+        """Corner residuals and keystone of the current homography"""
+        projected = cv2.perspectiveTransform(test_corners.reshape(-1, 1, 2).astype(np.float32), self.homography)
+        residuals = np.linalg.norm((projected - self.reference_corners.reshape(-1, 1, 2))[:, 0], axis=1)
+
+        # Perspective terms of the normalized homography; both are zero for a
+        # pure similarity/affine mapping and grow with keystone distortion
+        normalized = self.homography / self.homography[2, 2]
+        return {
+            'homography': self.homography,
+            'corner_residuals': residuals,
+            'mean_corner_residual': float(np.mean(residuals)),
+            'keystone_horizontal': float(normalized[2, 0]),
+            'keystone_vertical': float(normalized[2, 1]),
+        }
+
+    def _match_corner_order(self, test_corners):
+        """
+        Reorder test corners to follow the reference ordering.
+
+        findChessboardCorners may start from any corner of the board, walk
+        rows in either direction (and on square boards walk it by columns),
+        which would fold a flip or a 90 degree rotation into the homography. The candidate ordering whose row
+        and column directions best agree with the reference is kept.
+        """
+        reference_grid = self._corner_grid(self.reference_corners)
+        grid = self._corner_grid(test_corners)
+
+        grids = [grid, grid.transpose(1, 0, 2)] if grid.shape[0] == grid.shape[1] else [grid]
+        candidates = [g[::row_step, ::col_step] for g in grids for row_step in (1, -1) for col_step in (1, -1)]
+
+        def direction_agreement(candidate):
+            score = 0.0
+            for axis in (0, 1):
+                ref_step = np.take(reference_grid, -1, axis=axis) - np.take(reference_grid, 0, axis=axis)
+                step = np.take(candidate, -1, axis=axis) - np.take(candidate, 0, axis=axis)
+                score += np.sum(ref_step * step) / (np.linalg.norm(ref_step) * np.linalg.norm(step) + 1e-9)
+            return score
+
+        best = max(candidates, key=direction_agreement)
+        return np.ascontiguousarray(best).reshape(-1, 1, 2)
+
+    def _board_mask(self):
+        """Reference pixels inside the board, including the outer ring of squares"""
+        grid = self._corner_grid(self.reference_corners)
+        pitch = np.median(np.linalg.norm(np.diff(grid, axis=1), axis=2))
+        hull = cv2.convexHull(self.reference_corners.reshape(-1, 2).astype(np.float32)).astype(np.int32)
+
+        mask = np.zeros(self.reference_image.shape, dtype=np.uint8)
+        cv2.fillConvexPoly(mask, hull, 255)
+        kernel_size = 2 * int(round(pitch)) + 1
+        mask = cv2.dilate(mask, cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_size, kernel_size)))
+        return mask > 0
+
+    def _corner_grid(self, corners):
+        """Reshape a corner list into a (rows, cols, 2) grid"""
+        return corners.reshape(self.checkerboard_size[0], self.checkerboard_size[1], 2)
+
+    def _normalize(self, image, mask):
+        """Zero-mean, unit-variance float image over the masked area, so captures and screenshots compare"""
+        image = image.astype(np.float32)
+        pixels = image[mask]
+        return (image - pixels.mean()) / max(pixels.std(), 1e-6)
+
+    def process(self, image, error_threshold=1.0):
+        """
+        Warp a capture onto the reference frame and diff it.
+
+        Args:
+            image: Grayscale capture from the station the maps were built for,
+                   with the test_shape passed to build_maps
+            error_threshold: Normalized error above which a pixel counts as misaligned
+
+        Returns:
+            Dictionary with the downsampled error heatmap over the board's
+            bounding box (self.roi, in reference pixels) and region statistics
+        """
+        if self.map1 is None:
+            raise ValueError("Warp maps not built, call build_maps first")
+        if image.shape[:2] != self.test_shape:
+            raise ValueError(f"Capture shape {image.shape[:2]} does not match the {self.test_shape} "
+                             f"the warp maps were built for")
+
+        warped = cv2.remap(image, self.map1, self.map2, cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+
+        # Normalize over the covered area only so the black border does not skew it
+        warped = self._normalize(warped, self.valid_mask)
+
+        error = np.abs(warped - self.reference_normalized)
+        error[~self.valid_mask] = 0
+
+        heatmap = cv2.resize(error, None, fx=self.heatmap_scale, fy=self.heatmap_scale, interpolation=cv2.INTER_AREA)
+
+        return {
+            'heatmap': heatmap,
+            'mean_error': float(error[self.valid_mask].mean()),
+            'coverage': float(self.valid_mask.mean()),
+            'regions': self._region_statistics(error, error_threshold),
+        }
+
+    def _region_statistics(self, error, error_threshold):
+        """Mean/max error and misaligned fraction for each region of the grid"""
+        rows, cols = self.region_grid
+        height, width = error.shape
+        row_edges = np.linspace(0, height, rows + 1).astype(int)
+        col_edges = np.linspace(0, width, cols + 1).astype(int)
+
+        regions = []
+        for row in range(rows):
+            for col in range(cols):
+                region = (slice(row_edges[row], row_edges[row + 1]), slice(col_edges[col], col_edges[col + 1]))
+                valid = self.valid_mask[region]
+                values = error[region][valid]
+                regions.append({
+                    'row': row,
+                    'col': col,
+                    'coverage': float(valid.mean()),
+                    'mean_error': float(values.mean()) if values.size else 0.0,
+                    'max_error': float(values.max()) if values.size else 0.0,
+                    'misaligned_fraction': float(np.mean(values > error_threshold)) if values.size else 0.0,
+                })
+        return regions
+
+
+if __name__ == "__main__":
+    from checker import AlignmentChecker
+
+    checker = AlignmentChecker(checkerboard_size=(7,7), visualize=False, verbose=False)
+    ref_corners, ref_image = checker.find_corners('reference_screen.png')
+    station_corners, station_image = checker.find_corners('ffc_1.jpg')
+
+    engine = WarpDiffEngine(ref_image, ref_corners, checkerboard_size=(7,7))
+    transform = engine.build_maps(station_corners, station_image.shape)
+    print(f"Mean corner residual: {transform['mean_corner_residual']:.3f} px")
+    print(f"Keystone: {transform['keystone_horizontal']:.2e} / {transform['keystone_vertical']:.2e}")
+
+    result = engine.process(cv2.imread('ffc_2.jpg', cv2.IMREAD_GRAYSCALE))
+    print(f"Mean error: {result['mean_error']:.3f}")
+    for region in result['regions']:
+        print(f"Region ({region['row']}, {region['col']}): mean {region['mean_error']:.3f}, "
+              f"misaligned {region['misaligned_fraction']:.1%}")